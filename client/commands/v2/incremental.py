@@ -4,10 +4,11 @@
 # LICENSE file in the root directory of this source tree.
 
 import dataclasses
+import itertools
 import json
 import logging
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List, Union
 
 from ... import (
     command_arguments,
@@ -15,7 +16,7 @@ from ... import (
     configuration as configuration_module,
     error,
 )
-from . import server_connection, start
+from . import language_server_protocol, server_connection, start
 
 
 LOG: logging.Logger = logging.getLogger(__name__)
@@ -46,7 +47,7 @@ def parse_type_error_response_json(response_json: object) -> List[error.Error]:
         raise InvalidServerResponse(message) from parsing_error
 
 
-def parse_type_error_response(response: str) -> List[error.Error]:
+def parse_type_error_response(response: Union[str, bytes]) -> List[error.Error]:
     try:
         response_json = json.loads(response)
         return parse_type_error_response_json(response_json)
@@ -55,6 +56,58 @@ def parse_type_error_response(response: str) -> List[error.Error]:
         raise InvalidServerResponse(message) from decode_error
 
 
+def parse_type_errors_by_path_json(
+    response_json: object,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Variant of `parse_type_error_response_json` used on the LSP subscription
+    path: group the raw error JSON objects by file path in a single pass,
+    without materializing an `error.Error` per entry. Most errors belong to
+    files that are never opened in the editor, so validation of the remaining
+    fields is deferred until an error is actually converted for display.
+    """
+    if (
+        isinstance(response_json, list)
+        and len(response_json) > 1
+        and response_json[0] == "TypeErrors"
+    ):
+        errors_json = response_json[1]
+        if isinstance(errors_json, list):
+
+            def get_path(error_json: Dict[str, Any]) -> str:
+                return error_json["path"]
+
+            try:
+                return {
+                    path: list(group)
+                    for path, group in itertools.groupby(
+                        sorted(errors_json, key=get_path), key=get_path
+                    )
+                }
+            except (KeyError, TypeError) as parsing_error:
+                message = f"Unexpected error JSON from server: {parsing_error}"
+                raise InvalidServerResponse(message) from parsing_error
+
+    raise InvalidServerResponse(
+        f"Unexpected JSON response from server: {response_json}"
+    )
+
+
+def parse_type_errors_by_path(
+    response: Union[str, bytes]
+) -> Dict[str, List[Dict[str, Any]]]:
+    try:
+        # This parses the initial subscription payload — the full project
+        # error set, i.e. the largest JSON message the client ever handles —
+        # so take advantage of `orjson` when it is available.
+        return parse_type_errors_by_path_json(
+            language_server_protocol.json_loads(response)
+        )
+    except json.JSONDecodeError as decode_error:
+        message = f"Cannot parse response as JSON: {decode_error}"
+        raise InvalidServerResponse(message) from decode_error
+
+
 def _relativize_error_path(error: error.Error) -> error.Error:
     relativized_path = error.path.relative_to(Path.cwd())
     return dataclasses.replace(error, path=relativized_path)
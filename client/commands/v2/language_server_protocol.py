@@ -6,17 +6,42 @@
 import asyncio
 import dataclasses
 import enum
+import json
 import urllib
 from pathlib import Path
-from typing import List, Iterable, Optional, Type, TypeVar
-
-import dataclasses_json
+from typing import Dict, List, Iterable, Mapping, Optional, Union
 
 from ... import json_rpc
 from . import async_server_connection
 
+try:
+    # `orjson` is a lot faster than the stdlib `json` module. Use it whenever
+    # possible, but do not force our users to install it.
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _json_dumps_bytes(json_object: object) -> bytes:
+    """
+    Serialize the given object to a compact JSON bytestring, taking advantage
+    of `orjson` when it is available. This function sits on the hot path of
+    every outgoing LSP message and is intended to be faster than `json.dumps`.
+    """
+    if orjson is not None:
+        return orjson.dumps(json_object)
+    return json.dumps(json_object, separators=(",", ":")).encode("utf-8")
+
 
-T = TypeVar("T")
+def json_loads(text: Union[str, bytes]) -> object:
+    """
+    Deserialize the given JSON string or bytestring, taking advantage of
+    `orjson` when it is available. May raise `json.JSONDecodeError` on
+    malformed input (`orjson` decode errors are subclasses of it).
+    """
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
 
 
 class ServerNotInitializedError(json_rpc.JSONRPCException):
@@ -53,6 +78,17 @@ def _get_content_length(headers: Iterable[str]) -> int:
         raise json_rpc.ParseError(f"Cannot parse content length into integer: {error}")
 
 
+def _parse_json_rpc_payload(payload: str) -> json_rpc.JSON:
+    try:
+        parsed_payload = json_loads(payload)
+        if not isinstance(parsed_payload, dict):
+            raise json_rpc.ParseError(f"Expected a JSON object but got {payload}")
+        return parsed_payload
+    except json.JSONDecodeError as error:
+        message = f"Cannot parse string into JSON: {error}"
+        raise json_rpc.ParseError(message) from error
+
+
 async def read_json_rpc(
     input_channel: async_server_connection.TextReader,
 ) -> json_rpc.Request:
@@ -66,35 +102,53 @@ async def read_json_rpc(
         content_length = _get_content_length(headers)
 
         payload = await input_channel.read_exactly(content_length)
-        return json_rpc.Request.from_string(payload)
+        return json_rpc.Request.from_json(_parse_json_rpc_payload(payload))
     except asyncio.IncompleteReadError as error:
         raise json_rpc.ParseError(str(error)) from error
 
 
+def _frame_json_rpc_payload(response: json_rpc.JSONRPC) -> bytes:
+    body = _json_dumps_bytes(response.json())
+    # `%`-formatting on bytes is a single C-level operation, as opposed to
+    # building the header from an f-string and encoding it afterwards.
+    return b"Content-Length: %d\r\n\r\n" % len(body) + body
+
+
 async def write_json_rpc(
     output_channel: async_server_connection.TextWriter, response: json_rpc.JSONRPC
 ) -> None:
     """
     Asynchronously write a JSON-RPC response to the given output channel.
     """
-    payload = response.serialize()
-    await output_channel.write(f"Content-Length: {len(payload)}\r\n\r\n{payload}")
+    # Frame and write at the bytes level: the message body is already encoded
+    # by the serializer, so going through the text adapter would only decode
+    # and re-encode it.
+    await output_channel.bytes_writer.write(_frame_json_rpc_payload(response))
 
 
-def _parse_parameters(parameters: json_rpc.Parameters, target: Type[T]) -> T:
+async def write_many_json_rpc(
+    output_channel: async_server_connection.TextWriter,
+    responses: Iterable[json_rpc.JSONRPC],
+) -> None:
     """
-    Parse the given JSON-RPC parameters into specified LSP parameters.
-    Raise `json_rpc.InvalidRequestError`on parsing failure.
+    Asynchronously write multiple JSON-RPC messages to the given output
+    channel. All messages are framed into a single buffer and issued as one
+    write, so the underlying stream is only flushed once rather than once
+    per message.
     """
+    await output_channel.bytes_writer.write(
+        b"".join(_frame_json_rpc_payload(response) for response in responses)
+    )
+
+
+def _get_by_name_parameter_values(
+    parameters: json_rpc.Parameters,
+) -> Mapping[str, object]:
     if not isinstance(parameters, json_rpc.ByNameParameters):
         raise json_rpc.InvalidRequestError(
             "Parameters for LSP requests must be passed by name"
         )
-    try:
-        # pyre-fixme[16]: Pyre doesn't understand `dataclasses_json`
-        return target.schema().load(parameters.values)
-    except (KeyError, ValueError, dataclasses_json.mm.ValidationError) as error:
-        raise json_rpc.InvalidRequestError(str(error)) from error
+    return parameters.values
 
 
 class SerializationSafeIntEnum(enum.IntEnum):
@@ -170,30 +224,24 @@ class DocumentUri:
         )
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class Position:
     line: int
     character: int
 
+    def to_dict(self) -> Dict[str, object]:
+        return {"line": self.line, "character": self.character}
+
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class Range:
     start: Position
     end: Position
 
+    def to_dict(self) -> Dict[str, object]:
+        return {"start": self.start.to_dict(), "end": self.end.to_dict()}
+
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class Diagnostic:
     range: Range
@@ -202,39 +250,35 @@ class Diagnostic:
     code: Optional[int] = None
     source: Optional[str] = None
 
+    def to_dict(self) -> Dict[str, object]:
+        # Hand-written serialization with static keys. Diagnostics are emitted
+        # in bulk on every type-error refresh, and the reflection-based
+        # `dataclasses_json` encoder is too slow for that.
+        return {
+            "range": self.range.to_dict(),
+            "message": self.message,
+            "severity": self.severity,
+            "code": self.code,
+            "source": self.source,
+        }
+
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class Info:
     name: str
     version: Optional[str] = None
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class TextDocumentSyncClientCapabilities:
     did_save: bool = False
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class PublishDiagnosticsClientTagSupport:
     value_set: List[DiagnosticTag] = dataclasses.field(default_factory=list)
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class PublishDiagnosticsClientCapabilities:
     related_information: bool = False
@@ -242,58 +286,93 @@ class PublishDiagnosticsClientCapabilities:
     version_support: bool = False
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class TextDocumentClientCapabilities:
     synchronization: Optional[TextDocumentSyncClientCapabilities] = None
     publish_diagnostics: Optional[PublishDiagnosticsClientCapabilities] = None
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class ClientCapabilities:
     text_document: Optional[TextDocumentClientCapabilities] = None
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
+def _text_document_client_capabilities_from_json(
+    text_document_json: object,
+) -> TextDocumentClientCapabilities:
+    # pyre-fixme[16]: JSON input is not statically typed
+    synchronization_json = text_document_json.get("synchronization")
+    synchronization = (
+        TextDocumentSyncClientCapabilities(
+            did_save=synchronization_json.get("didSave", False)
+        )
+        if synchronization_json is not None
+        else None
+    )
+
+    publish_diagnostics_json = text_document_json.get("publishDiagnostics")
+    publish_diagnostics = None
+    if publish_diagnostics_json is not None:
+        tag_support_json = publish_diagnostics_json.get("tagSupport")
+        tag_support = (
+            PublishDiagnosticsClientTagSupport(
+                value_set=[
+                    DiagnosticTag(value)
+                    for value in tag_support_json.get("valueSet", [])
+                ]
+            )
+            if tag_support_json is not None
+            else None
+        )
+        publish_diagnostics = PublishDiagnosticsClientCapabilities(
+            related_information=publish_diagnostics_json.get(
+                "relatedInformation", False
+            ),
+            tag_support=tag_support,
+            version_support=publish_diagnostics_json.get("versionSupport", False),
+        )
+
+    return TextDocumentClientCapabilities(
+        synchronization=synchronization, publish_diagnostics=publish_diagnostics
+    )
+
+
 @dataclasses.dataclass(frozen=True)
 class SaveOptions:
     include_text: Optional[bool] = None
 
+    def to_dict(self) -> Dict[str, object]:
+        return {"includeText": self.include_text}
+
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class TextDocumentSyncOptions:
     open_close: bool = False
     change: TextDocumentSyncKind = TextDocumentSyncKind.NONE
     save: Optional[SaveOptions] = None
 
+    def to_dict(self) -> Dict[str, object]:
+        save = self.save
+        return {
+            "openClose": self.open_close,
+            "change": self.change,
+            "save": save.to_dict() if save is not None else None,
+        }
+
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class ServerCapabilities:
     text_document_sync: Optional[TextDocumentSyncOptions] = None
 
+    def to_dict(self) -> Dict[str, object]:
+        text_document_sync = self.text_document_sync
+        return {
+            "textDocumentSync": (
+                text_document_sync.to_dict() if text_document_sync is not None else None
+            )
+        }
+
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class InitializeParameters:
     capabilities: ClientCapabilities
@@ -304,23 +383,58 @@ class InitializeParameters:
     def from_json_rpc_parameters(
         parameters: json_rpc.Parameters,
     ) -> "InitializeParameters":
-        return _parse_parameters(parameters, target=InitializeParameters)
+        # Initialization happens once per session so speed is not a concern
+        # here, but parsing by hand keeps this module free of reflection-based
+        # decoders. Unknown keys are ignored, like the rest of the parsers.
+        values = _get_by_name_parameter_values(parameters)
+        try:
+            process_id = values.get("processId")
+            if process_id is not None and not isinstance(process_id, int):
+                raise ValueError(f"`processId` is not an integer: {process_id}")
+            client_info_json = values.get("clientInfo")
+            client_info = (
+                Info(
+                    # pyre-fixme[16]: JSON input is not statically typed
+                    name=client_info_json["name"],
+                    # pyre-fixme[16]: JSON input is not statically typed
+                    version=client_info_json.get("version"),
+                )
+                if client_info_json is not None
+                else None
+            )
+
+            text_document_json = values["capabilities"].get("textDocument")
+            text_document = (
+                _text_document_client_capabilities_from_json(text_document_json)
+                if text_document_json is not None
+                else None
+            )
+            return InitializeParameters(
+                capabilities=ClientCapabilities(text_document=text_document),
+                process_id=process_id,
+                client_info=client_info,
+            )
+        except (KeyError, ValueError, TypeError, AttributeError) as error:
+            raise json_rpc.InvalidRequestError(str(error)) from error
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class InitializeResult:
     capabilities: ServerCapabilities
     server_info: Optional[Info] = None
 
+    def to_dict(self) -> Dict[str, object]:
+        server_info = self.server_info
+        return {
+            "capabilities": self.capabilities.to_dict(),
+            "serverInfo": (
+                {"name": server_info.name, "version": server_info.version}
+                if server_info is not None
+                else None
+            ),
+        }
+
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class TextDocumentIdentifier:
     uri: str
@@ -329,10 +443,6 @@ class TextDocumentIdentifier:
         return DocumentUri.parse(self.uri)
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class TextDocumentItem:
     uri: str
@@ -344,10 +454,6 @@ class TextDocumentItem:
         return DocumentUri.parse(self.uri)
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class DidOpenTextDocumentParameters:
     text_document: TextDocumentItem
@@ -356,13 +462,25 @@ class DidOpenTextDocumentParameters:
     def from_json_rpc_parameters(
         parameters: json_rpc.Parameters,
     ) -> "DidOpenTextDocumentParameters":
-        return _parse_parameters(parameters, target=DidOpenTextDocumentParameters)
+        # `didOpen` accounts for a large fraction of all incoming requests and
+        # has a fixed shape. Use a hand-written straight-line parser instead of
+        # the reflective `dataclasses_json` decoder.
+        values = _get_by_name_parameter_values(parameters)
+        try:
+            text_document = values["textDocument"]
+            return DidOpenTextDocumentParameters(
+                text_document=TextDocumentItem(
+                    # pyre-fixme[16]: JSON input is not statically typed
+                    uri=text_document["uri"],
+                    language_id=text_document["languageId"],
+                    version=text_document["version"],
+                    text=text_document["text"],
+                )
+            )
+        except (KeyError, TypeError) as error:
+            raise json_rpc.InvalidRequestError(str(error)) from error
 
 
-@dataclasses_json.dataclass_json(
-    letter_case=dataclasses_json.LetterCase.CAMEL,
-    undefined=dataclasses_json.Undefined.EXCLUDE,
-)
 @dataclasses.dataclass(frozen=True)
 class DidCloseTextDocumentParameters:
     text_document: TextDocumentIdentifier
@@ -371,4 +489,15 @@ class DidCloseTextDocumentParameters:
     def from_json_rpc_parameters(
         parameters: json_rpc.Parameters,
     ) -> "DidCloseTextDocumentParameters":
-        return _parse_parameters(parameters, target=DidCloseTextDocumentParameters)
+        # See `DidOpenTextDocumentParameters.from_json_rpc_parameters`.
+        values = _get_by_name_parameter_values(parameters)
+        try:
+            text_document = values["textDocument"]
+            return DidCloseTextDocumentParameters(
+                text_document=TextDocumentIdentifier(
+                    # pyre-fixme[16]: JSON input is not statically typed
+                    uri=text_document["uri"],
+                )
+            )
+        except (KeyError, TypeError) as error:
+            raise json_rpc.InvalidRequestError(str(error)) from error
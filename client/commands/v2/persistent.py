@@ -4,15 +4,33 @@
 # LICENSE file in the root directory of this source tree.
 
 import asyncio
+import concurrent.futures
 import contextlib
 import dataclasses
+import functools
+import itertools
 import json
 import logging
 import os
 import subprocess
 import tempfile
 from pathlib import Path
-from typing import Union, Optional, AsyncIterator, Set, List, Sequence, Dict
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
 from ... import (
     json_rpc,
@@ -31,15 +49,29 @@ from . import (
     server_event,
 )
 
+try:
+    # `uvloop`'s libuv-backed event loop schedules socket I/O noticeably faster
+    # than the default selector loop, which is where a persistent server spends
+    # most of its time. Use it whenever possible, but do not force our users to
+    # install it.
+    import uvloop
+
+    uvloop.install()
+except ImportError:
+    pass
+
 LOG: logging.Logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 
 def process_initialize_request(
     parameters: lsp.InitializeParameters,
 ) -> lsp.InitializeResult:
     LOG.info(
-        f"Received initialization request from {parameters.client_info} "
-        f" (pid = {parameters.process_id})"
+        "Received initialization request from %s (pid = %s)",
+        parameters.client_info,
+        parameters.process_id,
     )
 
     server_info = lsp.Info(name="pyre", version=version.__version__)
@@ -90,7 +122,7 @@ async def try_initialize(
     """
     try:
         request = await lsp.read_json_rpc(input_channel)
-        LOG.debug(f"Received pre-initialization LSP request: {request}")
+        LOG.debug("Received pre-initialization LSP request: %s", request)
 
         request_id = request.id
         if request_id is None:
@@ -113,7 +145,6 @@ async def try_initialize(
         result = process_initialize_request(initialize_parameters)
         await lsp.write_json_rpc(
             output_channel,
-            # pyre-fixme[16]: Pyre doesn't understand `dataclasses_json`
             json_rpc.SuccessResponse(id=request_id, result=result.to_dict()),
         )
 
@@ -133,56 +164,71 @@ async def try_initialize(
         return InitializationFailure(exception=json_rpc_error)
 
 
-@contextlib.asynccontextmanager
-async def _read_lsp_request(
-    input_channel: connection.TextReader, output_channel: connection.TextWriter
-) -> AsyncIterator[json_rpc.Request]:
-    try:
-        message = await lsp.read_json_rpc(input_channel)
-        yield message
-    except json_rpc.JSONRPCException as json_rpc_error:
-        await lsp.write_json_rpc(
-            output_channel,
-            json_rpc.ErrorResponse(
-                id=message.id,
-                code=json_rpc_error.error_code(),
-                message=str(json_rpc_error),
-            ),
-        )
+@functools.lru_cache(maxsize=1024)
+def _publish_uri_for_path(path: str) -> str:
+    # A pure function of `path` that allocates and URL-escapes on every call.
+    # Diagnostics are re-published for the same handful of opened documents on
+    # every type-error refresh, so cache the result.
+    return lsp.DocumentUri.from_file_path(Path(path)).unparse()
+
+
+def _publish_diagnostics_request(
+    path: str, diagnostics: Sequence[lsp.Diagnostic]
+) -> json_rpc.Request:
+    return json_rpc.Request(
+        method="textDocument/publishDiagnostics",
+        parameters=json_rpc.ByNameParameters(
+            {
+                "uri": _publish_uri_for_path(path),
+                "diagnostics": [diagnostic.to_dict() for diagnostic in diagnostics],
+            }
+        ),
+    )
 
 
 async def _publish_diagnostics(
     output_channel: connection.TextWriter,
-    path: Path,
+    path: str,
     diagnostics: Sequence[lsp.Diagnostic],
 ) -> None:
-    LOG.debug(f"Publish diagnostics for {path}: {diagnostics}")
+    LOG.debug("Publish diagnostics for %s: %s", path, diagnostics)
     await lsp.write_json_rpc(
-        output_channel,
-        json_rpc.Request(
-            method="textDocument/publishDiagnostics",
-            parameters=json_rpc.ByNameParameters(
-                {
-                    "uri": lsp.DocumentUri.from_file_path(path).unparse(),
-                    "diagnostics": [
-                        # pyre-fixme[16]: Pyre doesn't understand `dataclasses_json`
-                        diagnostic.to_dict()
-                        for diagnostic in diagnostics
-                    ],
-                }
-            ),
-        ),
+        output_channel, _publish_diagnostics_request(path, diagnostics)
     )
 
 
 @dataclasses.dataclass
 class ServerState:
-    opened_documents: Set[Path] = dataclasses.field(default_factory=set)
-    diagnostics: Dict[Path, List[lsp.Diagnostic]] = dataclasses.field(
+    # Documents and diagnostics are keyed by the string form of their paths:
+    # these keys are only ever compared for equality, and `str.__hash__` is
+    # much cheaper than `Path.__hash__`, which re-hashes the parsed parts on
+    # every lookup.
+    opened_documents: Set[str] = dataclasses.field(default_factory=set)
+    # LSP diagnostics, converted and cached only for opened documents.
+    diagnostics: Dict[str, List[lsp.Diagnostic]] = dataclasses.field(
+        default_factory=dict
+    )
+    # Raw error JSON for the whole project, grouped by path. Conversion into
+    # `lsp.Diagnostic` is deferred until a path is actually shown to the
+    # client, since most paths with errors are never opened.
+    type_errors: Dict[str, List[Dict[str, Any]]] = dataclasses.field(
         default_factory=dict
     )
 
 
+# Size bound on the request queue, so that a client flooding us with requests
+# ends up blocking on the transport instead of ballooning our memory use.
+REQUEST_QUEUE_MAX_SIZE: int = 128
+
+# The subscription name identifies this client process to the Pyre server and
+# never changes over the process lifetime, so encode the subscription command
+# once instead of on every (re)connect.
+_SUBSCRIPTION_NAME: str = f"persistent_{os.getpid()}"
+_SUBSCRIBE_TO_TYPE_ERRORS_COMMAND: bytes = (
+    f'["SubscribeToTypeErrors", "{_SUBSCRIPTION_NAME}"]\n'.encode("utf-8")
+)
+
+
 class Server:
     # I/O Channels
     input_channel: connection.TextReader
@@ -194,6 +240,7 @@ class Server:
     # Mutable States
     state: ServerState
     pyre_manager: connection.BackgroundTaskManager
+    request_queue: "asyncio.Queue[Optional[json_rpc.Request]]"
 
     def __init__(
         self,
@@ -208,18 +255,92 @@ class Server:
         self.client_capabilities = client_capabilities
         self.state = state
         self.pyre_manager = pyre_manager
+        self.request_queue = asyncio.Queue(maxsize=REQUEST_QUEUE_MAX_SIZE)
+        # Method dispatch table: one dict probe per request instead of a chain
+        # of string comparisons in `_run`.
+        self._dispatch: Dict[
+            str,
+            Tuple[
+                Callable[[json_rpc.Parameters], Any],
+                Callable[[Any], Awaitable[None]],
+            ],
+        ] = {
+            "textDocument/didOpen": (
+                lsp.DidOpenTextDocumentParameters.from_json_rpc_parameters,
+                self.process_open_request,
+            ),
+            "textDocument/didClose": (
+                lsp.DidCloseTextDocumentParameters.from_json_rpc_parameters,
+                self.process_close_request,
+            ),
+        }
+
+    async def _write_error_response(
+        self, error: json_rpc.JSONRPCException, request_id: Union[int, str, None]
+    ) -> None:
+        await lsp.write_json_rpc(
+            self.output_channel,
+            json_rpc.ErrorResponse(
+                id=request_id,
+                code=error.error_code(),
+                message=str(error),
+            ),
+        )
+
+    async def _read_requests_into_queue(self) -> None:
+        """
+        Read and parse requests from the input channel in a tight loop, handing
+        them over to the dispatching coroutine through `request_queue`. Keeping
+        the reader separate lets header parsing and JSON decoding of the next
+        request overlap with the processing of the previous one.
+        """
+        try:
+            while True:
+                try:
+                    request = await lsp.read_json_rpc(self.input_channel)
+                    await self.request_queue.put(request)
+                except json_rpc.ParseError as json_rpc_error:
+                    # LSP framing offers no way of resynchronizing with the
+                    # next message after a corrupted frame, so stop reading.
+                    # A plain EOF is how clients disconnect and not a protocol
+                    # error, so it does not warrant an error response (and the
+                    # output channel is usually gone by then as well).
+                    if not isinstance(
+                        json_rpc_error.__cause__, asyncio.IncompleteReadError
+                    ):
+                        await self._write_error_response(
+                            json_rpc_error, request_id=None
+                        )
+                    break
+                except json_rpc.JSONRPCException as json_rpc_error:
+                    await self._write_error_response(json_rpc_error, request_id=None)
+        except ConnectionError:
+            # The client is gone and error responses have nowhere to go. Fall
+            # through so the dispatcher still learns that reading has stopped.
+            pass
+        # When this task gets cancelled (by `run`'s cleanup, after the
+        # dispatcher has already returned), the `CancelledError` propagates
+        # before reaching this point. That is deliberate: with the dispatcher
+        # gone nobody drains the queue anymore, and awaiting `put` on a full
+        # queue would suspend this task — and its canceller — forever. The
+        # sentinel is only needed on organic termination, when the dispatcher
+        # is still listening.
+        await self.request_queue.put(None)
 
     async def wait_for_exit(self) -> int:
         while True:
-            async with _read_lsp_request(
-                self.input_channel, self.output_channel
-            ) as request:
-                LOG.debug(f"Received post-shutdown request: {request}")
+            request = await self.request_queue.get()
+            if request is None:
+                return commands.ExitCode.FAILURE
+            LOG.debug("Received post-shutdown request: %s", request)
 
-                if request.method == "exit":
-                    return 0
-                else:
-                    raise json_rpc.InvalidRequestError("LSP server has been shut down")
+            if request.method == "exit":
+                return 0
+            else:
+                await self._write_error_response(
+                    json_rpc.InvalidRequestError("LSP server has been shut down"),
+                    request_id=request.id,
+                )
 
     async def process_open_request(
         self, parameters: lsp.DidOpenTextDocumentParameters
@@ -229,15 +350,27 @@ class Server:
             raise json_rpc.InvalidRequestError(
                 f"Document URI is not a file: {parameters.text_document.uri}"
             )
-        self.state.opened_documents.add(document_path)
-        LOG.info(f"File opened: {document_path}")
-
-        document_diagnostics = self.state.diagnostics.get(document_path, None)
+        path = str(document_path)
+        self.state.opened_documents.add(path)
+        LOG.info("File opened: %s", path)
+
+        document_diagnostics = self.state.diagnostics.get(path, None)
+        if document_diagnostics is None:
+            # Diagnostics are only materialized for opened documents; convert
+            # (and cache) them now if this path has known type errors.
+            error_jsons = self.state.type_errors.get(path, None)
+            if error_jsons is not None:
+                try:
+                    document_diagnostics = _diagnostics_for_error_jsons(error_jsons)
+                    self.state.diagnostics[path] = document_diagnostics
+                except incremental.InvalidServerResponse as server_error:
+                    # A bad server payload should not take down the LSP server.
+                    LOG.error(
+                        "Pyre server returns invalid response: %s", server_error
+                    )
         if document_diagnostics is not None:
-            LOG.info(f"Update diagnostics for {document_path}")
-            await _publish_diagnostics(
-                self.output_channel, document_path, document_diagnostics
-            )
+            LOG.info("Update diagnostics for %s", path)
+            await _publish_diagnostics(self.output_channel, path, document_diagnostics)
 
     async def process_close_request(
         self, parameters: lsp.DidCloseTextDocumentParameters
@@ -247,61 +380,60 @@ class Server:
             raise json_rpc.InvalidRequestError(
                 f"Document URI is not a file: {parameters.text_document.uri}"
             )
+        path = str(document_path)
         try:
-            self.state.opened_documents.remove(document_path)
-            LOG.info(f"File closed: {document_path}")
+            self.state.opened_documents.remove(path)
+            LOG.info("File closed: %s", path)
 
-            if document_path in self.state.diagnostics:
-                LOG.info(f"Clear diagnostics for {document_path}")
-                await _publish_diagnostics(self.output_channel, document_path, [])
+            if path in self.state.diagnostics:
+                LOG.info("Clear diagnostics for %s", path)
+                await _publish_diagnostics(self.output_channel, path, [])
         except KeyError:
-            LOG.warning(f"Trying to close an un-opened file: {document_path}")
+            LOG.warning("Trying to close an un-opened file: %s", path)
 
     async def _run(self) -> int:
         while True:
-            async with _read_lsp_request(
-                self.input_channel, self.output_channel
-            ) as request:
-                LOG.debug(f"Received LSP request: {request}")
-
-                if request.method == "exit":
+            request = await self.request_queue.get()
+            if request is None:
+                return commands.ExitCode.FAILURE
+            LOG.debug("Received LSP request: %s", request)
+
+            try:
+                # Hot path first: document notifications vastly outnumber
+                # lifecycle requests, and the dispatch probe doubles as the
+                # "is this a lifecycle method" test. Lifecycle methods take no
+                # parameters, so none are parsed on that branch.
+                entry = self._dispatch.get(request.method)
+                if entry is not None:
+                    parser, handler = entry
+                    parameters = request.parameters
+                    if parameters is None:
+                        raise json_rpc.InvalidRequestError(
+                            f"Missing parameters for {request.method} method"
+                        )
+                    await handler(parser(parameters))
+                elif request.method == "exit":
                     return commands.ExitCode.FAILURE
                 elif request.method == "shutdown":
-                    lsp.write_json_rpc(
+                    await lsp.write_json_rpc(
                         self.output_channel,
                         json_rpc.SuccessResponse(id=request.id, result=None),
                     )
                     return await self.wait_for_exit()
-                elif request.method == "textDocument/didOpen":
-                    parameters = request.parameters
-                    if parameters is None:
-                        raise json_rpc.InvalidRequestError(
-                            "Missing parameters for didOpen method"
-                        )
-                    await self.process_open_request(
-                        lsp.DidOpenTextDocumentParameters.from_json_rpc_parameters(
-                            parameters
-                        )
-                    )
-                elif request.method == "textDocument/didClose":
-                    parameters = request.parameters
-                    if parameters is None:
-                        raise json_rpc.InvalidRequestError(
-                            "Missing parameters for didClose method"
-                        )
-                    await self.process_close_request(
-                        lsp.DidCloseTextDocumentParameters.from_json_rpc_parameters(
-                            parameters
-                        )
-                    )
                 elif request.id is not None:
                     raise lsp.RequestCancelledError("Request not supported yet")
+            except json_rpc.JSONRPCException as json_rpc_error:
+                await self._write_error_response(json_rpc_error, request_id=request.id)
 
     async def run(self) -> int:
+        read_task = asyncio.ensure_future(self._read_requests_into_queue())
         try:
             await self.pyre_manager.ensure_task_running()
             return await self._run()
         finally:
+            read_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await read_task
             await self.pyre_manager.ensure_task_stop()
 
 
@@ -309,28 +441,44 @@ async def _start_pyre_server(
     binary_location: str, pyre_arguments: start.Arguments
 ) -> bool:
     try:
-        with start.server_argument_file(pyre_arguments) as argument_file_path:
-            server_environment = {
-                **os.environ,
-                # This is to make sure that backend server shares the socket root
-                # directory with the client.
-                # TODO(T77556312): It might be cleaner to turn this into a
-                # configuration option instead.
-                "TMPDIR": tempfile.gettempdir(),
-            }
+        with contextlib.ExitStack() as stack:
+            # Argument-file and log-file setup are synchronous file I/O. Enter
+            # those context managers from a worker thread so the event loop
+            # (and with it, LSP request handling) is not blocked on disk
+            # during server startup.
+            loop = asyncio.get_event_loop()
+
+            def enter_context(context_manager: ContextManager[T]) -> T:
+                # Typed wrapper: pyre cannot unify `ExitStack.enter_context`'s
+                # generic signature with `run_in_executor`'s callable argument.
+                return stack.enter_context(context_manager)
+
+            argument_file_path = await loop.run_in_executor(
+                None, enter_context, start.server_argument_file(pyre_arguments)
+            )
 
-            with start.background_server_log_file(
-                Path(pyre_arguments.log_path)
-            ) as server_stderr:
-                server_process = await asyncio.create_subprocess_exec(
-                    binary_location,
-                    "newserver",
-                    str(argument_file_path),
-                    stdout=subprocess.PIPE,
-                    stderr=server_stderr,
-                    env=server_environment,
-                    start_new_session=True,
-                )
+            # Copy the environment instead of rebuilding it from a dict splat.
+            server_environment = os.environ.copy()
+            # This is to make sure that backend server shares the socket root
+            # directory with the client.
+            # TODO(T77556312): It might be cleaner to turn this into a
+            # configuration option instead.
+            server_environment["TMPDIR"] = tempfile.gettempdir()
+
+            server_stderr = await loop.run_in_executor(
+                None,
+                enter_context,
+                start.background_server_log_file(Path(pyre_arguments.log_path)),
+            )
+            server_process = await asyncio.create_subprocess_exec(
+                binary_location,
+                "newserver",
+                str(argument_file_path),
+                stdout=subprocess.PIPE,
+                stderr=server_stderr,
+                env=server_environment,
+                start_new_session=True,
+            )
 
             server_stdout = server_process.stdout
             if server_stdout is None:
@@ -345,19 +493,23 @@ async def _start_pyre_server(
 
         return True
     except Exception as error:
-        LOG.error(f"Exception occured during server start: {error}")
+        LOG.error("Exception occured during server start: %s", error)
         return False
 
 
 @dataclasses.dataclass(frozen=True)
 class SubscriptionResponse:
     name: str
-    body: List[error.Error] = dataclasses.field(default_factory=list)
+    # Raw error JSON grouped by path; see `ServerState.type_errors`.
+    body: Dict[str, List[Dict[str, Any]]] = dataclasses.field(default_factory=dict)
 
 
-def parse_subscription_response(response: str) -> SubscriptionResponse:
+def parse_subscription_response(response: Union[str, bytes]) -> SubscriptionResponse:
+    # Accepting raw `bytes` here lets the subscription loop feed socket reads
+    # straight into the JSON parser, skipping one UTF-8 decoding pass over
+    # payloads that can be several megabytes for large projects.
     try:
-        response_json = json.loads(response)
+        response_json = lsp.json_loads(response)
         # The response JSON is expected to have the following form:
         # `{"name": "foo", "body": ["TypeErrors", [error_json, ...]]}`
         if isinstance(response_json, dict):
@@ -365,7 +517,7 @@ def parse_subscription_response(response: str) -> SubscriptionResponse:
             body = response_json.get("body", None)
             if name is not None and body is not None:
                 return SubscriptionResponse(
-                    name=name, body=incremental.parse_type_error_response_json(body)
+                    name=name, body=incremental.parse_type_errors_by_path_json(body)
                 )
         raise incremental.InvalidServerResponse(
             f"Unexpected JSON subscription from server: {response_json}"
@@ -390,15 +542,108 @@ def type_error_to_diagnostic(type_error: error.Error) -> lsp.Diagnostic:
     )
 
 
-def type_errors_to_diagnostics(
+def _diagnostics_for_errors(
+    type_errors: Iterable[error.Error],
+) -> List[lsp.Diagnostic]:
+    # Batch equivalent of `type_error_to_diagnostic` (keep the two in sync).
+    # This loop runs once per type error on every refresh, so all names are
+    # hoisted into locals and each iteration only pays for the dataclass
+    # constructions themselves.
+    Diagnostic = lsp.Diagnostic
+    Range = lsp.Range
+    Position = lsp.Position
+    severity_error = lsp.DiagnosticSeverity.ERROR
+    return [
+        Diagnostic(
+            range=Range(
+                start=Position(line=type_error.line - 1, character=type_error.column),
+                end=Position(
+                    line=type_error.stop_line - 1, character=type_error.stop_column
+                ),
+            ),
+            message=type_error.description,
+            severity=severity_error,
+            code=None,
+            source="Pyre",
+        )
+        for type_error in type_errors
+    ]
+
+
+def _diagnostics_for_error_jsons(
+    error_jsons: Iterable[Dict[str, Any]],
+) -> List[lsp.Diagnostic]:
+    """
+    Same as `_diagnostics_for_errors`, but reading straight from the raw
+    error JSON that the Pyre server sent, without an intermediate
+    `error.Error` per entry. Since field validation is deferred until this
+    point, a malformed entry surfaces here as
+    `incremental.InvalidServerResponse`.
+    """
+    Diagnostic = lsp.Diagnostic
+    Range = lsp.Range
+    Position = lsp.Position
+    severity_error = lsp.DiagnosticSeverity.ERROR
+    try:
+        return [
+            Diagnostic(
+                range=Range(
+                    start=Position(
+                        line=error_json["line"] - 1, character=error_json["column"]
+                    ),
+                    end=Position(
+                        line=error_json["stop_line"] - 1,
+                        character=error_json["stop_column"],
+                    ),
+                ),
+                message=error_json["description"],
+                severity=severity_error,
+                code=None,
+                source="Pyre",
+            )
+            for error_json in error_jsons
+        ]
+    except (KeyError, TypeError) as parsing_error:
+        message = f"Unexpected error JSON from server: {parsing_error}"
+        raise incremental.InvalidServerResponse(message) from parsing_error
+
+
+def type_errors_by_path(
     type_errors: Sequence[error.Error],
-) -> Dict[Path, List[lsp.Diagnostic]]:
-    result: Dict[Path, List[lsp.Diagnostic]] = {}
-    for type_error in type_errors:
-        result.setdefault(type_error.path, []).append(
-            type_error_to_diagnostic(type_error)
+) -> Dict[str, List[error.Error]]:
+    # Group by path with a single sort + `itertools.groupby` pass instead of
+    # one `setdefault` hash probe per error. The sort is stable, so the
+    # per-path error order is preserved.
+    def get_path(type_error: error.Error) -> str:
+        return str(type_error.path)
+
+    return {
+        path: list(group)
+        for path, group in itertools.groupby(
+            sorted(type_errors, key=get_path), key=get_path
         )
-    return result
+    }
+
+
+def type_errors_to_diagnostics(
+    type_errors: Sequence[error.Error],
+) -> Dict[str, List[lsp.Diagnostic]]:
+    return {
+        path: _diagnostics_for_errors(group)
+        for path, group in type_errors_by_path(type_errors).items()
+    }
+
+
+# Fingerprint of an empty diagnostic list, i.e. what the client shows for a
+# path we have never published anything for.
+_EMPTY_DIAGNOSTICS_FINGERPRINT: int = hash(())
+
+
+def _diagnostics_fingerprint(diagnostics: Sequence[lsp.Diagnostic]) -> int:
+    # `lsp.Diagnostic` is a frozen dataclass, so the tuple hash covers every
+    # field. Keeping an int per path is much cheaper than retaining the full
+    # list that was last published and comparing it element-by-element.
+    return hash(tuple(diagnostics))
 
 
 class PyreServerHandler(connection.BackgroundTask):
@@ -407,6 +652,8 @@ class PyreServerHandler(connection.BackgroundTask):
     pyre_arguments: start.Arguments
     client_output_channel: connection.TextWriter
     server_state: ServerState
+    _last_published_fingerprints: Dict[str, int]
+    _parse_pool: concurrent.futures.ThreadPoolExecutor
 
     def __init__(
         self,
@@ -421,6 +668,13 @@ class PyreServerHandler(connection.BackgroundTask):
         self.pyre_arguments = pyre_arguments
         self.client_output_channel = client_output_channel
         self.server_state = server_state
+        self._last_published_fingerprints = {}
+        # Parsing a full type-error refresh can take tens of milliseconds on a
+        # large project. Running it on a worker thread keeps the decode from
+        # monopolizing the event loop in one uninterrupted stretch; the decoder
+        # still holds the GIL, so the loop only interleaves other work at
+        # interpreter switch intervals. A single worker keeps updates ordered.
+        self._parse_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
     async def show_message_to_client(
         self, message: str, level: lsp.MessageType = lsp.MessageType.INFO
@@ -448,44 +702,74 @@ class PyreServerHandler(connection.BackgroundTask):
             LOG.debug(message)
         await self.show_message_to_client(message, level)
 
-    def update_type_errors(self, type_errors: Sequence[error.Error]) -> None:
+    def update_type_errors(
+        self, type_errors: Dict[str, List[Dict[str, Any]]]
+    ) -> None:
         LOG.info(
             "Refereshing type errors received from Pyre server. "
-            f"Total number of type errors is {len(type_errors)}."
+            "Total number of type errors is %d.",
+            sum(map(len, type_errors.values())),
         )
-        self.server_state.diagnostics = type_errors_to_diagnostics(type_errors)
+        server_state = self.server_state
+        server_state.type_errors = type_errors
+        # Only materialize `lsp.Diagnostic` objects for the documents the
+        # client actually has open — typically a handful of paths out of
+        # thousands with errors. `process_open_request` converts lazily for
+        # documents opened later.
+        server_state.diagnostics = {
+            path: _diagnostics_for_error_jsons(type_errors[path])
+            for path in server_state.opened_documents
+            if path in type_errors
+        }
 
     async def show_type_errors_to_client(self) -> None:
+        # The Pyre server resends the full set of type errors on every update,
+        # even when nothing relevant to the opened documents has changed. Only
+        # publish paths whose diagnostics actually differ from what the client
+        # last saw. A `publishDiagnostics` message replaces all previous
+        # diagnostics for its path, so no separate "clear" message is needed.
+        pending_requests: List[json_rpc.Request] = []
+        last_published_fingerprints = self._last_published_fingerprints
         for path in self.server_state.opened_documents:
-            await _publish_diagnostics(self.client_output_channel, path, [])
-            diagnostics = self.server_state.diagnostics.get(path, None)
-            if diagnostics is not None:
-                await _publish_diagnostics(
-                    self.client_output_channel, path, diagnostics
-                )
+            diagnostics = self.server_state.diagnostics.get(path, [])
+            fingerprint = _diagnostics_fingerprint(diagnostics)
+            if (
+                last_published_fingerprints.get(path, _EMPTY_DIAGNOSTICS_FINGERPRINT)
+                == fingerprint
+            ):
+                continue
+            pending_requests.append(_publish_diagnostics_request(path, diagnostics))
+            last_published_fingerprints[path] = fingerprint
+        if len(pending_requests) > 0:
+            # Batch all updated paths into a single write + flush instead of
+            # draining the output channel once per document.
+            await lsp.write_many_json_rpc(self.client_output_channel, pending_requests)
 
     @contextlib.asynccontextmanager
     async def _read_server_response(
-        self, server_input_channel: connection.TextReader
-    ) -> AsyncIterator[str]:
+        self, server_input_channel: connection.BytesReader
+    ) -> AsyncIterator[bytes]:
         try:
             raw_response = await server_input_channel.readline()
             yield raw_response
         except incremental.InvalidServerResponse as error:
-            LOG.error(f"Pyre server returns invalid response: {error}")
+            LOG.error("Pyre server returns invalid response: %s", error)
 
     async def subscribe_to_type_error(
         self,
-        server_input_channel: connection.TextReader,
-        server_output_channel: connection.TextWriter,
+        server_input_channel: connection.BytesReader,
+        server_output_channel: connection.BytesWriter,
     ) -> None:
-        subscription_name = f"persistent_{os.getpid()}"
-        await server_output_channel.write(
-            f'["SubscribeToTypeErrors", "{subscription_name}"]\n'
-        )
+        await server_output_channel.write(_SUBSCRIBE_TO_TYPE_ERRORS_COMMAND)
 
+        # Parsing happens on `_parse_pool` rather than inline, so a large
+        # decode does not block the event loop in a single uninterrupted
+        # stretch (see `__init__` for the caveat about the GIL).
+        loop = asyncio.get_event_loop()
         async with self._read_server_response(server_input_channel) as first_response:
-            initial_type_errors = incremental.parse_type_error_response(first_response)
+            initial_type_errors = await loop.run_in_executor(
+                self._parse_pool, incremental.parse_type_errors_by_path, first_response
+            )
             self.update_type_errors(initial_type_errors)
             await self.show_type_errors_to_client()
 
@@ -493,10 +777,12 @@ class PyreServerHandler(connection.BackgroundTask):
             async with self._read_server_response(
                 server_input_channel
             ) as raw_subscription_response:
-                subscription_response = parse_subscription_response(
-                    raw_subscription_response
+                subscription_response = await loop.run_in_executor(
+                    self._parse_pool,
+                    parse_subscription_response,
+                    raw_subscription_response,
                 )
-                if subscription_name == subscription_response.name:
+                if _SUBSCRIPTION_NAME == subscription_response.name:
                     self.update_type_errors(subscription_response.body)
                     await self.show_type_errors_to_client()
 
@@ -505,7 +791,9 @@ class PyreServerHandler(connection.BackgroundTask):
             log_directory=Path(self.pyre_arguments.log_path)
         )
         try:
-            async with connection.connect_in_text_mode(socket_path) as (
+            # Connect in raw binary mode: subscription responses get handed to
+            # the JSON parser as `bytes`, without an intermediate `str` copy.
+            async with connection.connect(socket_path) as (
                 input_channel,
                 output_channel,
             ):
@@ -525,7 +813,7 @@ class PyreServerHandler(connection.BackgroundTask):
                     f"Pyre server at `{self.server_identifier}` has been initialized."
                 )
 
-                async with connection.connect_in_text_mode(socket_path) as (
+                async with connection.connect(socket_path) as (
                     input_channel,
                     output_channel,
                 ):
@@ -549,7 +837,7 @@ async def run_persistent(
         elif isinstance(initialize_result, InitializationSuccess):
             client_capabilities = initialize_result.client_capabilities
             LOG.info("Initialization successful.")
-            LOG.debug(f"Client capabilities: {client_capabilities}")
+            LOG.debug("Client capabilities: %s", client_capabilities)
             initial_server_state = ServerState()
             server = Server(
                 input_channel=stdin,
@@ -572,7 +860,7 @@ async def run_persistent(
             message = (
                 str(exception) if exception is not None else "ignoring notification"
             )
-            LOG.info(f"Initialization failed: {message}")
+            LOG.info("Initialization failed: %s", message)
             # Loop until we get either InitializeExit or InitializeSuccess
         else:
             raise RuntimeError("Cannot determine the type of initialize_result")
@@ -590,6 +878,6 @@ def run(
 
     server_identifier = start.get_server_identifier(configuration)
     pyre_arguments = start.create_server_arguments(configuration, start_arguments)
-    return asyncio.get_event_loop().run_until_complete(
+    return asyncio.run(
         run_persistent(binary_location, server_identifier, pyre_arguments)
     )
@@ -118,20 +118,23 @@ class LSPInputOutputTest(testslide.TestCase):
         await assert_write(
             json_rpc.SuccessResponse(id=0, result=42),
             expected=(
-                "Content-Length: 41\r\n\r\n"
-                + json.dumps({"jsonrpc": "2.0", "id": 0, "result": 42})
+                "Content-Length: 36\r\n\r\n"
+                + json.dumps(
+                    {"jsonrpc": "2.0", "id": 0, "result": 42}, separators=(",", ":")
+                )
             ),
         )
         await assert_write(
             json_rpc.ErrorResponse(id=0, code=42, message="derp"),
             expected=(
-                "Content-Length: 69\r\n\r\n"
+                "Content-Length: 61\r\n\r\n"
                 + json.dumps(
                     {
                         "jsonrpc": "2.0",
                         "id": 0,
                         "error": {"code": 42, "message": "derp"},
-                    }
+                    },
+                    separators=(",", ":"),
                 )
             ),
         )
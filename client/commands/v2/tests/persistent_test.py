@@ -8,7 +8,9 @@ from pathlib import Path
 
 import testslide
 
-from .... import json_rpc, error
+from typing import Iterable
+
+from .... import json_rpc, error, commands
 from ....tests import setup
 from .. import language_server_protocol as lsp
 from ..async_server_connection import (
@@ -27,6 +29,7 @@ from ..persistent import (
     InitializationSuccess,
     InitializationFailure,
     InitializationExit,
+    PyreServerHandler,
     Server,
     ServerState,
     parse_subscription_response,
@@ -34,6 +37,7 @@ from ..persistent import (
     type_error_to_diagnostic,
     type_errors_to_diagnostics,
 )
+from .. import start
 
 
 async def _create_input_channel_with_request(request: json_rpc.Request) -> TextReader:
@@ -42,6 +46,15 @@ async def _create_input_channel_with_request(request: json_rpc.Request) -> TextR
     return TextReader(MemoryBytesReader(bytes_writer.items()[0]))
 
 
+async def _create_input_channel_with_requests(
+    requests: Iterable[json_rpc.Request],
+) -> TextReader:
+    bytes_writer = MemoryBytesWriter()
+    for request in requests:
+        await lsp.write_json_rpc(TextWriter(bytes_writer), request)
+    return TextReader(MemoryBytesReader(b"".join(bytes_writer.items())))
+
+
 class NoOpBackgroundTask(BackgroundTask):
     async def run(self) -> None:
         pass
@@ -146,18 +159,20 @@ class PersistentTest(testslide.TestCase):
             ),
             expected=SubscriptionResponse(
                 name="foo",
-                body=[
-                    error.Error(
-                        line=1,
-                        column=1,
-                        stop_line=2,
-                        stop_column=2,
-                        path=Path("test.py"),
-                        code=42,
-                        name="Fake name",
-                        description="Fake description",
-                    ),
-                ],
+                body={
+                    "test.py": [
+                        {
+                            "line": 1,
+                            "column": 1,
+                            "stop_line": 2,
+                            "stop_column": 2,
+                            "path": "test.py",
+                            "code": 42,
+                            "name": "Fake name",
+                            "description": "Fake description",
+                        },
+                    ],
+                },
             ),
         )
 
@@ -184,7 +199,7 @@ class PersistentTest(testslide.TestCase):
                 )
             )
         )
-        self.assertIn(test_path0, server_state.opened_documents)
+        self.assertIn(str(test_path0), server_state.opened_documents)
 
         await server.process_open_request(
             lsp.DidOpenTextDocumentParameters(
@@ -196,7 +211,7 @@ class PersistentTest(testslide.TestCase):
                 )
             )
         )
-        self.assertIn(test_path1, server_state.opened_documents)
+        self.assertIn(str(test_path1), server_state.opened_documents)
 
         await server.process_close_request(
             lsp.DidCloseTextDocumentParameters(
@@ -205,14 +220,14 @@ class PersistentTest(testslide.TestCase):
                 )
             )
         )
-        self.assertNotIn(test_path0, server_state.opened_documents)
+        self.assertNotIn(str(test_path0), server_state.opened_documents)
 
     @setup.async_test
     async def test_open_close_with_diagnostics(self) -> None:
         test_path = Path("/foo.py")
         server_state = ServerState(
             diagnostics={
-                test_path: [
+                str(test_path): [
                     lsp.Diagnostic(
                         range=lsp.Range(
                             start=lsp.Position(line=0, character=1),
@@ -258,6 +273,123 @@ class PersistentTest(testslide.TestCase):
         # Another diagnostic update is sent via the output channel
         self.assertEqual(len(bytes_writer.items()), 2)
 
+    @setup.async_test
+    async def test_server_run__shutdown_and_exit(self) -> None:
+        test_path = Path("/foo.py")
+        input_channel = await _create_input_channel_with_requests(
+            [
+                json_rpc.Request(
+                    method="textDocument/didOpen",
+                    parameters=json_rpc.ByNameParameters(
+                        {
+                            "textDocument": {
+                                "languageId": "python",
+                                "text": "",
+                                "uri": lsp.DocumentUri.from_file_path(
+                                    test_path
+                                ).unparse(),
+                                "version": 0,
+                            }
+                        }
+                    ),
+                ),
+                json_rpc.Request(id=0, method="shutdown", parameters=None),
+                json_rpc.Request(method="exit", parameters=None),
+            ]
+        )
+        server_state = ServerState()
+        bytes_writer = MemoryBytesWriter()
+        server = Server(
+            input_channel=input_channel,
+            output_channel=TextWriter(bytes_writer),
+            client_capabilities=lsp.ClientCapabilities(),
+            state=server_state,
+            pyre_manager=BackgroundTaskManager(NoOpBackgroundTask()),
+        )
+        exit_code = await server.run()
+        self.assertEqual(exit_code, 0)
+        self.assertIn(str(test_path), server_state.opened_documents)
+        # Only the shutdown request gets a (success) response.
+        self.assertEqual(len(bytes_writer.items()), 1)
+
+    @setup.async_test
+    async def test_server_run__immediate_eof(self) -> None:
+        bytes_writer = MemoryBytesWriter()
+        server = Server(
+            input_channel=create_memory_text_reader(""),
+            output_channel=TextWriter(bytes_writer),
+            client_capabilities=lsp.ClientCapabilities(),
+            state=ServerState(),
+            pyre_manager=BackgroundTaskManager(NoOpBackgroundTask()),
+        )
+        exit_code = await server.run()
+        self.assertEqual(exit_code, commands.ExitCode.FAILURE)
+        # A clean disconnect is not a protocol error: no response is written.
+        self.assertEqual(len(bytes_writer.items()), 0)
+
+    @setup.async_test
+    async def test_server_run__corrupted_frame(self) -> None:
+        bytes_writer = MemoryBytesWriter()
+        server = Server(
+            input_channel=TextReader(
+                MemoryBytesReader(b"Content-Length: 4\r\n\r\nderp")
+            ),
+            output_channel=TextWriter(bytes_writer),
+            client_capabilities=lsp.ClientCapabilities(),
+            state=ServerState(),
+            pyre_manager=BackgroundTaskManager(NoOpBackgroundTask()),
+        )
+        exit_code = await server.run()
+        self.assertEqual(exit_code, commands.ExitCode.FAILURE)
+        # The client is told about the parse error before reading stops.
+        self.assertEqual(len(bytes_writer.items()), 1)
+
+    @setup.async_test
+    async def test_show_type_errors_to_client(self) -> None:
+        test_path = "/foo.py"
+        server_state = ServerState(opened_documents={test_path})
+        bytes_writer = MemoryBytesWriter()
+        handler = PyreServerHandler(
+            binary_location="/bin/pyre",
+            server_identifier="foo",
+            pyre_arguments=start.Arguments(log_path="/log", global_root="/root"),
+            client_output_channel=TextWriter(bytes_writer),
+            server_state=server_state,
+        )
+        error_json = {
+            "line": 1,
+            "column": 1,
+            "stop_line": 2,
+            "stop_column": 2,
+            "path": test_path,
+            "code": 42,
+            "name": "Fake name",
+            "description": "Fake description",
+        }
+
+        handler.update_type_errors({test_path: [error_json]})
+        await handler.show_type_errors_to_client()
+        # New diagnostics are published to the client, batched in one write.
+        self.assertEqual(len(bytes_writer.items()), 1)
+        self.assertTrue(bytes_writer.items()[0].startswith(b"Content-Length: "))
+
+        handler.update_type_errors({test_path: [error_json]})
+        await handler.show_type_errors_to_client()
+        # A refresh with unchanged diagnostics publishes nothing.
+        self.assertEqual(len(bytes_writer.items()), 1)
+
+        changed_error_json = {**error_json, "description": "Changed description"}
+        handler.update_type_errors({test_path: [changed_error_json]})
+        await handler.show_type_errors_to_client()
+        # A refresh with changed diagnostics publishes exactly once.
+        self.assertEqual(len(bytes_writer.items()), 2)
+
+        handler.update_type_errors({})
+        await handler.show_type_errors_to_client()
+        # Disappearing errors are cleared with an empty publish.
+        self.assertEqual(len(bytes_writer.items()), 3)
+        self.assertIn(b'"diagnostics":[]', bytes_writer.items()[-1])
+
     def test_diagnostics(self) -> None:
         self.assertEqual(
             type_error_to_diagnostic(
@@ -319,7 +451,7 @@ class PersistentTest(testslide.TestCase):
                 ]
             ),
             {
-                Path("/foo.py"): [
+                "/foo.py": [
                     lsp.Diagnostic(
                         range=lsp.Range(
                             start=lsp.Position(line=0, character=1),
@@ -341,7 +473,7 @@ class PersistentTest(testslide.TestCase):
                         source="Pyre",
                     ),
                 ],
-                Path("/bar.py"): [
+                "/bar.py": [
                     lsp.Diagnostic(
                         range=lsp.Range(
                             start=lsp.Position(line=3, character=4),
@@ -24,7 +24,6 @@ MODULE_NAME = "pyre_check"
 RUNTIME_DEPENDENCIES = [
     "click",
     "dataclasses",
-    "dataclasses-json",
     "pywatchman",
     "psutil",
     "libcst>=0.3.6",